@@ -2877,8 +2877,8 @@ cdef class IntervalDictionary(IntervalContainer):
         self.intervals = new
 
 def buildIntervalDictionary(*args):
-    '''unpickling - return a rebuilt SamplerShift object.'''
-    return IntervalCollection(unreduce=args)
+    '''unpickling - return a rebuilt IntervalDictionary object.'''
+    return IntervalDictionary(unreduce=args)
 
 #####################################################################
 #####################################################################
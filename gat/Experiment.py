@@ -44,6 +44,7 @@ import time
 import inspect
 import os
 import optparse
+import argparse
 import logging
 import collections
 import copy
@@ -152,6 +153,34 @@ def callbackShortHelp(option, opt, value, parser):
     parser.exit()
 
 
+class ShortHelpAction(argparse.Action):
+    '''output short help (only command line options).'''
+
+    def __init__(self, option_strings, dest, default=None, help=None):
+        argparse.Action.__init__(self, option_strings=option_strings,
+                                 dest=dest, default=default, nargs=0,
+                                 help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        parser.description = None
+        parser.usage = None
+        parser.print_help()
+        parser.exit()
+
+
+class ExtendAction(argparse.Action):
+    '''extend a list with all values given to an option.
+
+    Equivalent to ``action="extend"``, which requires python >= 3.8.
+    '''
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        # copy to not modify the default
+        items = copy.copy(getattr(namespace, self.dest, None) or [])
+        items.extend(values)
+        setattr(namespace, self.dest, items)
+
+
 class MultiLineFormatter(logging.Formatter):
 
     '''logfile formatter: add identation for multi-line entries.'''
@@ -192,6 +221,19 @@ def Start(parser=None,
 
     global global_options, global_args, global_starting_time
 
+    if isinstance(parser, argparse.ArgumentParser):
+        if add_mysql_options or add_psql_options or add_cluster_options:
+            raise ValueError(
+                "database and cluster options require an optparse parser")
+        return startArguments(parser,
+                              argv=argv,
+                              quiet=quiet,
+                              no_parsing=no_parsing,
+                              add_csv_options=add_csv_options,
+                              add_pipe_options=add_pipe_options,
+                              add_output_options=add_output_options,
+                              return_parser=return_parser)
+
     # save default values given by user
     user_defaults = copy.copy(parser.defaults)
 
@@ -355,6 +397,129 @@ def Start(parser=None,
     if not no_parsing:
         (global_options, global_args) = parser.parse_args(argv[1:])
 
+    return configureOptions(add_pipe_options)
+
+
+def startArguments(parser,
+                   argv=sys.argv,
+                   quiet=False,
+                   no_parsing=False,
+                   add_csv_options=False,
+                   add_pipe_options=True,
+                   add_output_options=False,
+                   return_parser=False):
+    """set up an experiment with an :class:`argparse.ArgumentParser`.
+
+    This is the equivalent of :func:`Start` for argparse parsers.
+    Positional arguments are not collected, *args* is always an empty
+    list.
+
+    returns a tuple containing (options, args).
+    """
+
+    global global_options, global_args, global_starting_time
+
+    global_starting_time = time.time()
+
+    # defaults set by the user before calling this function take
+    # precedence over the ones below
+    defaults = dict(loglevel=0 if quiet else 1,
+                    timeit_file=None,
+                    timeit_name='all',
+                    timeit_header=None)
+
+    group = parser.add_argument_group("Script timing options")
+
+    group.add_argument("--timeit", dest='timeit_file',
+                       help="store timeing information in file "
+                       "[%(default)s].")
+    group.add_argument("--timeit-name", dest='timeit_name',
+                       help="name in timing file for this class of jobs "
+                       "[%(default)s].")
+    group.add_argument("--timeit-header", dest='timeit_header',
+                       action="store_true", default=None,
+                       help="add header for timing information "
+                       "[%(default)s].")
+
+    group = parser.add_argument_group("Common options")
+
+    group.add_argument("-v", "--verbose", dest="loglevel", type=int,
+                       help="loglevel [%(default)s]. The higher, the more "
+                       "output.")
+
+    group.add_argument("-?", dest="short_help", action=ShortHelpAction,
+                       help="output short help (command line options only.")
+
+    if add_csv_options:
+        parser.add_argument("--csv-dialect", dest="csv_dialect",
+                            help="csv dialect to use [%(default)s].")
+
+        defaults.update(dict(
+            csv_dialect="excel-tab",
+            csv_lineterminator="\n"))
+
+    if add_output_options or add_pipe_options:
+        group = parser.add_argument_group("Input/output options")
+
+        if add_output_options:
+            group.add_argument(
+                "-P", "--output-filename-pattern",
+                dest="output_filename_pattern",
+                help="OUTPUT filename pattern for various methods "
+                "[%(default)s].")
+
+            group.add_argument("-F", "--force-output", dest="output_force",
+                               action="store_true",
+                               help="force over-writing of existing files.")
+
+            defaults.update(dict(output_filename_pattern="%s",
+                                 output_force=False))
+
+        if add_pipe_options:
+
+            group.add_argument("-I", "--stdin", dest="stdin",
+                               help="file to read stdin from "
+                               "[default = stdin].",
+                               metavar="FILE")
+            group.add_argument("-L", "--log", dest="stdlog",
+                               help="file with logging information "
+                               "[default = stdout].",
+                               metavar="FILE")
+            group.add_argument("-E", "--error", dest="stderr",
+                               help="file with error information "
+                               "[default = stderr].",
+                               metavar="FILE")
+            group.add_argument("-S", "--stdout", dest="stdout",
+                               help="file where output is to go "
+                               "[default = stdout].",
+                               metavar="FILE")
+
+            defaults.update(dict(stderr=sys.stderr,
+                                 stdout=sys.stdout,
+                                 stdlog=sys.stdout,
+                                 stdin=sys.stdin))
+
+    parser.set_defaults(**dict(
+        (key, value) for key, value in list(defaults.items())
+        if parser.get_default(key) is None))
+
+    if return_parser:
+        return parser
+
+    if not no_parsing:
+        global_options = parser.parse_args(argv[1:])
+        global_args = []
+
+    return configureOptions(add_pipe_options)
+
+
+def configureOptions(add_pipe_options=True):
+    """open input/output streams and configure logging according
+    to the parsed command line options.
+
+    returns a tuple containing (options, args).
+    """
+
     if add_pipe_options:
         if global_options.stdout != sys.stdout:
             global_options.stdout = openFile(global_options.stdout, "w")
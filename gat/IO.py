@@ -1,6 +1,15 @@
 import re
 import os
+import io
 import glob
+import pickle
+import hashlib
+import tempfile
+import fnmatch
+import collections
+import functools
+import operator
+import multiprocessing
 import gat
 import gat.IOTools as IOTools
 import gat.Experiment as E
@@ -11,31 +20,73 @@ import gat.SegmentList as SegmentList
 import gat.Engine as Engine
 
 try:
+    import matplotlib
+    # plots are only written to files
+    matplotlib.use("Agg")
     import matplotlib.pyplot as plt
     HASPLOT = True
 except (ImportError, RuntimeError):
     HASPLOT = False
 
 
+@functools.lru_cache(maxsize=None)
+def _compileSectionPatterns(patterns):
+    return [re.compile(x) for x in patterns]
+
+
+def isSectionSelected(section, patterns):
+    '''return True if *section* is selected by any of *patterns*.
+
+    A section is selected if it is listed in *patterns*, if *patterns*
+    contains "all" or if any of the *patterns* matches as a regular
+    expression.
+    '''
+    if section in patterns or "all" in patterns:
+        return True
+    return any(x.search(section)
+               for x in _compileSectionPatterns(tuple(patterns)))
+
+
 def dumpStats(coll, section, options):
-    if section in options.output_stats or \
-            "all" in options.output_stats or \
-            len([x for x in options.output_stats
-                 if re.search(x, section)]) > 0:
+    if isSectionSelected(section, options.output_stats):
         coll.outputStats(E.openOutputFile(section))
 
 
 def dumpBed(coll, section, options):
-    if section in options.output_bed or \
-            "all" in options.output_bed or \
-            len([x for x in options.output_bed if re.search(x, section)]) > 0:
+    if isSectionSelected(section, options.output_bed):
         coll.save(E.openOutputFile(section + ".bed"))
 
 
+def getIntervalCacheFilename(cache_dir,
+                             filenames,
+                             enable_split_tracks=False,
+                             ignore_tracks=False):
+    """return the name of the cache file for an interval collection
+    loaded from *filenames*.
+
+    The name depends on the names, sizes and modification times
+    of the files and the loading options. The compiled modules
+    defining the pickled objects are part of the key as well, so
+    that a cache is not re-used after gat has been rebuilt.
+    """
+    key = hashlib.sha1()
+    key.update(("%s\t%s\n" % (bool(enable_split_tracks),
+                               bool(ignore_tracks))).encode("utf-8"))
+    for filename in [Engine.__file__, SegmentList.__file__] + \
+            list(filenames):
+        st = os.stat(filename)
+        key.update(("%s\t%i\t%i\n" % (
+            os.path.abspath(filename),
+            st.st_size,
+            st.st_mtime_ns)).encode("utf-8"))
+    return os.path.join(cache_dir, "%s.pickle" % key.hexdigest())
+
+
 def readSegmentList(label,
                     filenames,
                     enable_split_tracks=False,
-                    ignore_tracks=False):
+                    ignore_tracks=False,
+                    cache_dir=None):
     """read one or more segment files.
 
     Arguments
@@ -48,12 +99,35 @@ def readSegmentList(label,
         If True, allow tracks to be split across multiple files.
     ignore_tracks : int
         If True, ignore track information.
+    cache_dir : string
+        If given, parsed intervals are cached in this directory
+        and re-used if the same files are loaded again.
 
     Returns
     -------
     segments : IntervalCollection
         The segment collection.
     """
+
+    if cache_dir:
+        cache_filename = getIntervalCacheFilename(
+            cache_dir, filenames,
+            enable_split_tracks=enable_split_tracks,
+            ignore_tracks=ignore_tracks)
+        if os.path.exists(cache_filename):
+            E.info("%s: reading tracks from cache %s" %
+                   (label, cache_filename))
+            try:
+                with open(cache_filename, "rb") as inf:
+                    results = pickle.load(inf)
+            except Exception as msg:
+                E.warn("%s: could not read cache %s, "
+                       "re-reading tracks: %s" %
+                       (label, cache_filename, msg))
+            else:
+                results.setName(label)
+                return results
+
     results = Engine.IntervalCollection(name=label)
     E.info("%s: reading tracks from %i files" % (label, len(filenames)))
     results.load(filenames,
@@ -61,28 +135,166 @@ def readSegmentList(label,
                  ignore_tracks=ignore_tracks)
     E.info("%s: read %i tracks from %i files" %
            (label, len(results), len(filenames)))
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        E.info("%s: saving tracks to cache %s" % (label, cache_filename))
+        # write to a temporary file first so that concurrent runs
+        # never see a partial cache file
+        fd, tmp_filename = tempfile.mkstemp(dir=cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as outf:
+                pickle.dump(results, outf, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_filename, cache_filename)
+        except Exception:
+            os.unlink(tmp_filename)
+            raise
+
     return results
 
 
 def readAnnotatorResults(filename):
-    '''load annotator results from a tab-separated results table.'''
+    '''load annotator results from a tab-separated results table.
+
+    The numeric columns are parsed with :func:`numpy.loadtxt`, only
+    track and annotation are split off in python.
+    '''
+
+    with IOTools.openFile(filename, "r") as infile:
+        lines = [line for line in infile
+                 if not line.startswith("#") and
+                 not line.startswith("track")]
+
+    if not lines:
+        return []
+
+    values = numpy.loadtxt(lines,
+                           delimiter="\t",
+                           usecols=list(range(2, 11)),
+                           comments=None,
+                           dtype=numpy.float64,
+                           ndmin=2)
 
+    # convert column-wise to avoid building a list per row
+    values = zip(*[x.tolist() for x in values.T])
+
+    fromValues = gat.DummyAnnotatorResult._fromValues
     annotator_results = []
+    for line, v in zip(lines, values):
+        track, annotation, _ = line.split("\t", 2)
+        annotator_results.append(fromValues(track, annotation, v))
+
+    return annotator_results
+
+
+# options that determine the contents of a results table
+RESULTS_PARAMETERS = ("pvalue_method",
+                      "qvalue_method",
+                      "qvalue_lambda",
+                      "qvalue_pi0_method",
+                      "output_order",
+                      "input_filename_descriptions")
+
+
+def readResultsParameters(filename):
+    '''return a dictionary of the parameters recorded in the
+    header of the results table in *filename*.
 
+    Values are returned as strings.
+    '''
+
+    rx = re.compile(r"^# (\S+)\s*: (.*)$")
+    params = {}
     with IOTools.openFile(filename, "r") as infile:
         for line in infile:
-            if line.startswith("#"):
-                continue
-            if line.startswith("track"):
-                continue
-            r = gat.DummyAnnotatorResult._fromLine(line)
-            annotator_results.append(r)
+            if not line.startswith("#"):
+                break
+            m = rx.match(line[:-1])
+            if m:
+                params[m.group(1)] = m.group(2)
+    return params
 
-    return annotator_results
+
+def isResultsTableCurrent(filename, options):
+    '''return True if the results table in *filename* has been
+    computed with the same statistics and output options as given
+    in *options*.
+
+    Only the parameters in :data:`RESULTS_PARAMETERS` are compared.
+    Tables without recorded parameters are never current.
+    '''
+    if options.pvalue_method != "empirical" or \
+       options.output_plots_pattern:
+        return False
+
+    params = readResultsParameters(filename)
+    return all(params.get(x, None) == str(getattr(options, x))
+               for x in RESULTS_PARAMETERS)
+
+
+def copyAnnotatorResults(filename, outfile):
+    '''copy the results table in *filename* to *outfile*
+    without the comment lines.'''
+
+    with IOTools.openFile(filename, "r") as infile:
+        rows = (x for x in infile if not x.startswith("#"))
+        header = next(rows, "")
+        if not header.startswith("track\tannotation\t"):
+            raise ValueError("%s is not a results table: got %s" %
+                             (filename, header))
+        outfile.write(header)
+        outfile.writelines(rows)
 
 
 def expandGlobs(infiles):
-    return IOTools.flatten([glob.glob(x) for x in infiles])
+    '''expand glob patterns in *infiles*.
+
+    Patterns are grouped by directory so that each directory is
+    scanned only once. Literal filenames are checked for existence
+    without scanning their directory. Patterns with wildcards in the
+    directory part are passed on to :func:`glob.glob`.
+
+    Matches are returned in the order of the patterns.
+    '''
+
+    by_directory = collections.defaultdict(list)
+    matches = {}
+    for pattern in infiles:
+        dirname, basename = os.path.split(pattern)
+        if glob.has_magic(dirname) or not basename:
+            continue
+        if glob.has_magic(basename):
+            by_directory[dirname].append(basename)
+        elif os.path.lexists(pattern):
+            matches[(dirname, basename)] = [basename]
+        else:
+            matches[(dirname, basename)] = []
+
+    for dirname, basenames in by_directory.items():
+        try:
+            with os.scandir(dirname or os.curdir) as it:
+                entries = [x.name for x in it]
+        except OSError:
+            entries = []
+
+        for basename in basenames:
+            rx = re.compile(fnmatch.translate(basename))
+            # as glob, do not match hidden files unless asked for
+            hidden = basename.startswith(".")
+            matches[(dirname, basename)] = [
+                x for x in entries
+                if rx.match(x) and (hidden or not x.startswith("."))]
+
+    result = []
+    for pattern in infiles:
+        dirname, basename = os.path.split(pattern)
+        if (dirname, basename) not in matches:
+            result.extend(glob.glob(pattern))
+        else:
+            result.extend([os.path.join(dirname, x)
+                           for x in matches[(dirname, basename)]])
+
+    return result
 
 
 def buildSegments(options):
@@ -111,7 +323,8 @@ def buildSegments(options):
     # read one or more segment files
     segments = readSegmentList("segments",
                                options.segment_files,
-                               ignore_tracks=options.ignore_segment_tracks)
+                               ignore_tracks=options.ignore_segment_tracks,
+                               cache_dir=options.interval_cache_dir)
     segments.normalize()
 
     if segments.sum() == 0:
@@ -126,7 +339,8 @@ def buildSegments(options):
     annotations = readSegmentList(
         "annotations", options.annotation_files,
         enable_split_tracks=options.enable_split_tracks,
-        ignore_tracks=options.annotations_label is not None)
+        ignore_tracks=options.annotations_label is not None,
+        cache_dir=options.interval_cache_dir)
 
     if options.annotations_label is not None:
         annotations.setName(options.annotations_label)
@@ -142,7 +356,8 @@ def buildSegments(options):
 
     workspaces = readSegmentList(
         "workspaces", options.workspace_files, options,
-        options.enable_split_tracks)
+        options.enable_split_tracks,
+        cache_dir=options.interval_cache_dir)
     workspaces.normalize()
 
     # intersect workspaces to build a single workspace
@@ -285,13 +500,55 @@ def applyIsochores(segments, annotations, workspaces,
     # output segment densities per workspace
     if "overlap" in options.output_stats or \
             "all" in options.output_stats:
-        for track in segments.tracks:
+        outputOverlapStats(workspaces, segments, options.num_threads)
+
+    return workspace
+
+
+# workspaces used by worker processes in outputOverlapStats
+_workspaces = None
+
+
+def _initOverlapStats(workspaces):
+    global _workspaces
+    _workspaces = workspaces
+
+
+def _computeOverlapStats(segments):
+    '''return overlap stats of *segments* with the workspaces
+    as a string.'''
+    outfile = io.StringIO()
+    _workspaces.outputOverlapStats(outfile, segments)
+    return outfile.getvalue()
+
+
+def outputOverlapStats(workspaces, segments, num_threads=0):
+    '''output overlap stats between *workspaces* and each track
+    in *segments*, one file per track.
+
+    If *num_threads* is larger than 0, tracks are processed in
+    parallel.
+    '''
+
+    tracks = segments.tracks
+    if num_threads > 0 and len(tracks) > 1:
+        E.info("computing overlap stats for %i tracks with %i threads" %
+               (len(tracks), num_threads))
+        # the pool is terminated on leaving the block, all
+        # results have been collected by then
+        with multiprocessing.Pool(num_threads,
+                                  initializer=_initOverlapStats,
+                                  initargs=(workspaces,)) as pool:
+            stats = pool.imap(_computeOverlapStats,
+                              [segments[track] for track in tracks])
+            for track, s in zip(tracks, stats):
+                E.openOutputFile("overlap_%s" % track).write(s)
+    else:
+        for track in tracks:
             workspaces.outputOverlapStats(
                 E.openOutputFile("overlap_%s" % track),
                 segments[track])
 
-    return workspace
-
 
 def readDescriptions(options):
     '''read descriptions from tab separated file.'''
@@ -454,6 +711,41 @@ def outputMetrics(outfile, segments, workspace, track, section):
     outfile.flush()
 
 
+# attributes to sort results by for each output order, most
+# significant key first.
+SORT_KEYS = {
+    "track": ("track", "annotation"),
+    "annotation": ("annotation", "track"),
+    "observed": ("observed",),
+    "fold": ("fold",),
+    "pvalue": ("pvalue",),
+    "qvalue": ("qvalue",),
+}
+
+
+def sortResults(results, order):
+    '''return a list of *results* sorted by *order*.
+
+    The sort is stable. See :data:`SORT_KEYS` for the available
+    orders.
+    '''
+
+    try:
+        attributes = SORT_KEYS[order]
+    except KeyError:
+        raise ValueError("unknown sort order %s" % order)
+
+    if len(attributes) == 1:
+        return sorted(results, key=operator.attrgetter(*attributes))
+
+    # comparing tuples of strings is slow, sort composite string
+    # keys with lexsort, which uses the last key as the primary key
+    keys = [numpy.array([getattr(x, attribute) for x in results],
+                        dtype=str)
+            for attribute in reversed(attributes)]
+    return [results[x] for x in numpy.lexsort(keys)]
+
+
 def outputResults(results,
                   options,
                   header,
@@ -463,7 +755,9 @@ def outputResults(results,
                   format_observed="%i"):
     '''compute FDR and output results.'''
 
-    pvalues = [x.pvalue for x in results]
+    pvalues = numpy.fromiter((x.pvalue for x in results),
+                             dtype=numpy.float64,
+                             count=len(results))
 
     ##################################################
     ##################################################
@@ -488,76 +782,141 @@ def outputResults(results,
 
         is_tuple = False
 
-    counters = set([x.counter for x in results])
+    # group results by counter in a single pass
+    results_per_counter = collections.OrderedDict()
+    for x in results:
+        results_per_counter.setdefault(x.counter, []).append(x)
 
-    for counter in counters:
+    for counter, output in results_per_counter.items():
 
-        if len(counters) == 1:
+        if len(results_per_counter) == 1:
             outfile = options.stdout
-            output = results
         else:
             outfilename = re.sub("%s", counter, options.output_tables_pattern)
             E.info("output for counter %s goes to outfile %s" %
                    (counter, outfilename))
             outfile = IOTools.openFile(outfilename, "w")
-            output = [x for x in results if x.counter == counter]
 
         outfile.write(
             "\t".join(list(header) + list(description_header)) + "\n")
 
-        if options.output_order == "track":
-            output.sort(key=lambda x: (x.track, x.annotation))
-        elif options.output_order == "observed":
-            output.sort(key=lambda x: x.observed)
-        elif options.output_order == "annotation":
-            output.sort(key=lambda x: (x.annotation, x.track))
-        elif options.output_order == "fold":
-            output.sort(key=lambda x: x.fold)
-        elif options.output_order == "pvalue":
-            output.sort(key=lambda x: x.pvalue)
-        elif options.output_order == "qvalue":
-            output.sort(key=lambda x: x.qvalue)
-        else:
-            raise ValueError("unknown sort order %s" % options.output_order)
+        output = sortResults(output, options.output_order)
 
-        for result in output:
-            if is_tuple:
-                outfile.write("\t".join(map(str, result)))
-            else:
-                outfile.write(str(result))
+        if is_tuple:
+            toRow = lambda x: "\t".join(map(str, x))
+        else:
+            toRow = str
+
+        # build each row completely before writing it
+        if descriptions:
+            empty = [""] * description_width
+            rows = ("%s\t%s\n" % (toRow(x),
+                                  "\t".join(descriptions.get(x.annotation,
+                                                             empty)))
+                    for x in output)
+        else:
+            rows = ("%s\n" % toRow(x) for x in output)
 
-            if descriptions:
-                try:
-                    outfile.write(
-                        "\t" + "\t".join(descriptions[result.annotation]))
-                except KeyError:
-                    outfile.write("\t" + "\t".join([""] * description_width))
-            outfile.write("\n")
+        outfile.writelines(rows)
 
         if outfile != options.stdout:
             outfile.close()
 
 
+def normalDensity(x, mu, sigma):
+    '''return the density of a normal distribution with mean *mu*
+    and standard deviation *sigma* at *x*.
+
+    The density is computed in place in a single array.
+    '''
+    density = numpy.subtract(x, mu, dtype=numpy.float64)
+    density **= 2
+    density /= -2.0 * sigma ** 2
+    numpy.exp(density, out=density)
+    density *= 1.0 / (sigma * numpy.sqrt(2 * numpy.pi))
+    return density
+
+
+# characters not permitted in plot filenames
+_SANITIZE = re.compile(r"[^a-zA-Z0-9\-_./]")
+
+
+def buildPlotFilename(options, key):
+    '''return filename for plot *key* according to
+    *options.output_plots_pattern*.
+
+    Characters other than alphanumeric ones and ``-_./`` are replaced
+    by ``_``. The directory of the file is created if necessary.
+    '''
+    filename = _SANITIZE.sub(
+        "_", options.output_plots_pattern.replace("%s", key))
+    dirname = os.path.dirname(filename)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    return filename
+
+
+def plotSampleDistribution(fig, key, samples, observed, expected, stddev,
+                           filename):
+    '''plot the distribution of *samples* together with the *observed*
+    value and a normal distribution fitted to the samples into *fig*
+    and save to *filename*.'''
+
+    fig.clear()
+    ax = fig.add_subplot(111)
+
+    hist, bins = numpy.histogram(samples,
+                                 bins=100,
+                                 density=True)
+
+    # plot bars from the pre-computed histogram
+    ax.hist(bins[:-1], bins=bins, weights=hist, label=key)
+
+    ax.axvline(observed, color='r', linewidth=2)
+
+    # plot estimated
+    ax.plot(bins,
+            normalDensity(bins, expected, stddev),
+            label="std distribution",
+            linewidth=2,
+            color='g')
+
+    ax.legend()
+    fig.savefig(filename)
+
+
+# figure re-used by a worker process in plotResults
+_figure = None
+
+
+def _plotSampleDistribution(args):
+    global _figure
+    if _figure is None:
+        _figure = plt.figure()
+    plotSampleDistribution(_figure, *args)
+
+
 def plotResults(results, options):
-    '''plot annotator results.'''
+    '''plot annotator results.
+
+    If *options.num_threads* is larger than 0, plots are rendered in
+    parallel. Without the attribute, plots are rendered serially.
+    '''
 
     ##################################################
     # plot histograms
     if options.output_plots_pattern and HASPLOT:
-
-        def buildPlotFilename(options, key):
-            filename = re.sub("%s", key, options.output_plots_pattern)
-            filename = re.sub("[^a-zA-Z0-9-_./]", "_", filename)
-            dirname = os.path.dirname(filename)
-            if dirname and not os.path.exists(dirname):
-                os.makedirs(dirname)
-            return filename
-
         E.info("plotting sample stats")
 
+        # collect pvalues and qvalues while iterating over results
+        pvalues, qvalues = [], []
+        work = []
+
         for r in results:
 
-            plt.figure()
+            pvalues.append(r.pvalue)
+            qvalues.append(r.qvalue)
+
             k = []
             if r.track != "merged":
                 k.append(r.track)
@@ -566,39 +925,42 @@ def plotResults(results, options):
                 k.append(r.counter)
             key = "-".join(k)
 
-            s = r.samples
-            hist, bins = numpy.histogram(s,
-                                         bins=100)
-
-            # plot bars
-            plt.hist(s, bins=100, normed=True, label=key)
-
-            plt.axvline(r.observed, color='r', linewidth=2)
-
-            # plot estimated
-            sigma = r.stddev
-            mu = r.expected
-            plt.plot(bins,
-                     1.0 / (sigma * numpy.sqrt(2 * numpy.pi)) *
-                     numpy.exp(- (bins - mu) ** 2 / (2 * sigma ** 2)),
-                     label="std distribution",
-                     linewidth=2,
-                     color='g')
-
-            plt.legend()
-            filename = buildPlotFilename(options, key)
-            plt.savefig(filename)
+            # only pass plain values to the plotting function.
+            # Single precision is sufficient for the histogram
+            # and halves the data to be binned and transferred.
+            work.append((key,
+                         r.samples.astype(numpy.float32),
+                         r.observed,
+                         r.expected,
+                         r.stddev,
+                         buildPlotFilename(options, key)))
+
+        # re-use a single figure for all plots
+        fig = plt.figure()
+
+        # not all scripts offer --num-threads
+        num_threads = getattr(options, "num_threads", 0)
+        if num_threads > 0 and len(work) > 1:
+            E.info("plotting %i sample distributions with %i threads" %
+                   (len(work), num_threads))
+            with multiprocessing.Pool(num_threads) as pool:
+                pool.map(_plotSampleDistribution, work,
+                         chunksize=max(1, len(work) //
+                                       (4 * num_threads)))
+        else:
+            for args in work:
+                plotSampleDistribution(fig, *args)
 
         E.info("plotting P-value distribution")
 
         key = "pvalue"
-        plt.figure()
+        fig.clear()
 
-        x, bins, y = plt.hist([r.pvalue for r in results],
+        x, bins, y = plt.hist(pvalues,
                               bins=numpy.arange(0, 1.05, 0.025),
                               label="pvalue")
 
-        plt.hist([r.qvalue for r in results],
+        plt.hist(qvalues,
                  bins=numpy.arange(0, 1.05, 0.025),
                  label="qvalue",
                  alpha=0.5)
@@ -612,3 +974,4 @@ def plotResults(results, options):
 
         filename = buildPlotFilename(options, key)
         plt.savefig(filename)
+        plt.close(fig)
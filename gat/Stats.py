@@ -37,11 +37,14 @@ def computeQValues(pvalues,
     http://genomics.princeton.edu/storeylab/qvalue/linux.html.
     """
 
-    if min(pvalues) < 0 or max(pvalues) > 1:
+    m = len(pvalues)
+    pvalues = numpy.array(pvalues, dtype=numpy.float64)
+
+    if pvalues.min() < 0 or pvalues.max() > 1:
         raise ValueError("p-values out of range")
 
-    m = len(pvalues)
-    pvalues = numpy.array(pvalues, dtype=numpy.float)
+    # sorted pvalues to count pvalues below/above thresholds
+    sorted_pvalues = numpy.sort(pvalues)
 
     if vlambda == None:
         vlambda = numpy.arange(0, 0.95, 0.05)
@@ -63,15 +66,14 @@ def computeQValues(pvalues,
             if vlambda < 0 or vlambda >= 1:
                 raise ValueError("vlambda must be within [0, 1).")
 
-            pi0 = numpy.mean([x >= vlambda for x in pvalues]) / (1.0 - vlambda)
+            pi0 = numpy.mean(pvalues >= vlambda) / (1.0 - vlambda)
             pi0 = min(pi0, 1.0)
         else:
-
-            pi0 = numpy.zeros(len(vlambda), numpy.float)
-
-            for i in range(len(vlambda)):
-                pi0[i] = numpy.mean([x >= vlambda[i]
-                                     for x in pvalues]) / (1.0 - vlambda[i])
+            vlambda = numpy.asarray(vlambda, dtype=numpy.float64)
+            # proportion of pvalues >= vlambda[i]
+            pi0 = (m - numpy.searchsorted(sorted_pvalues, vlambda,
+                                          side="left")) / \
+                (float(m) * (1.0 - vlambda))
 
             if pi0_method == "smoother":
                 if smooth_log_pi0:
@@ -89,18 +91,17 @@ def computeQValues(pvalues,
             elif pi0_method == "bootstrap":
                 minpi0 = min(pi0)
 
-                mse = numpy.zeros(len(vlambda), numpy.float)
-                pi0_boot = numpy.zeros(len(vlambda), numpy.float)
+                mse = numpy.zeros(len(vlambda), numpy.float64)
 
                 for i in range(100):
                     # sample pvalues
                     idx_boot = numpy.random.random_integers(0, m - 1, m)
-                    pvalues_boot = pvalues[idx_boot]
+                    pvalues_boot = numpy.sort(pvalues[idx_boot])
 
-                    for x in range(len(vlambda)):
-                        # compute number of pvalues larger than lambda[x]
-                        pi0_boot[x] = numpy.mean(
-                            pvalues_boot > vlambda[x]) / (1.0 - vlambda[x])
+                    # proportion of pvalues larger than vlambda[x]
+                    pi0_boot = (m - numpy.searchsorted(pvalues_boot, vlambda,
+                                                       side="right")) / \
+                        (float(m) * (1.0 - vlambda))
                     mse += (pi0_boot - minpi0) ** 2
                 pi0 = min(pi0[mse == min(mse)])
             else:
@@ -119,29 +120,18 @@ def computeQValues(pvalues,
     # compute qvalues
 
     idx = numpy.argsort(pvalues)
-    # monotonically decreasing bins, so that bins[i-1] > x >=  bins[i]
-    bins = numpy.unique(pvalues)[::-1]
 
     # v[i] = number of observations less than or equal to pvalue[i]
-    # could this be done more elegantly?
-    val2bin = len(bins) - numpy.digitize(pvalues, bins)
-    v = numpy.zeros(m, dtype=numpy.int)
-    lastbin = None
-    for x in range(m - 1, -1, -1):
-        bin = val2bin[idx[x]]
-        if bin != lastbin:
-            c = x
-        v[idx[x]] = c + 1
-        lastbin = bin
+    v = numpy.searchsorted(sorted_pvalues, pvalues, side="right")
 
     qvalues = pvalues * pi0 * m / v
     if robust:
         qvalues /= (1.0 - (1.0 - pvalues) ** m)
 
-    # bound qvalues by 1 and make them monotonic
-    qvalues[idx[m - 1]] = min(qvalues[idx[m - 1]], 1.0)
-    for i in range(m - 2, -1, -1):
-        qvalues[idx[i]] = min(min(qvalues[idx[i]], qvalues[idx[i + 1]]), 1.0)
+    # bound qvalues by 1 and make them monotonic: running minimum
+    # from the largest pvalue downwards
+    qvalues[idx] = numpy.minimum.accumulate(
+        numpy.minimum(qvalues[idx], 1.0)[::-1])[::-1]
 
     # fill result
     result = FDRResult()
@@ -1,6 +1,6 @@
 import os
 import re
-import optparse
+import argparse
 import collections
 import gzip
 import numpy
@@ -47,138 +47,126 @@ def readFromBedOld(filenames, name="track"):
     return segment_lists
 
 
-class OptionGroup(optparse.OptionGroup):
-    pass
-
-
 def buildParser(usage=None):
     '''return gat command line parser.
     '''
 
-    parser = optparse.OptionParser(version="%prog version: $Id:",
-                                   usage=usage)
+    parser = argparse.ArgumentParser(
+        description=usage,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--version", action="version",
+                        version="%(prog)s version: $Id:")
 
-    group = OptionGroup(parser, "Input options")
+    group = parser.add_argument_group("Input options")
 
-    group.add_option(
+    group.add_argument(
         "-a", "--annotation-bed-file", "--annotations", "--annotation-file",
-        dest="annotation_files", type="string", action="append",
-        help="filename with annotations [default=%default].")
+        dest="annotation_files", nargs="+", action=E.ExtendAction, metavar="FILE",
+        help="filename(s) with annotations [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "-s", "--segment-bed-file", "--segments", "--segment-file",
-        dest="segment_files", type="string",
-        action="append",
-        help="filename with segments. Also accepts a "
-        "glob in parentheses [default=%default].")
+        dest="segment_files", nargs="+", action=E.ExtendAction, metavar="FILE",
+        help="filename(s) with segments. Also accepts a "
+        "glob in parentheses [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "-w", "--workspace-bed-file", "--workspace", "--workspace-file",
-        dest="workspace_files", type="string", action="append",
-        help="filename with workspace segments. Also "
-        "accepts a glob in parentheses [default=%default].")
+        dest="workspace_files", nargs="+", action=E.ExtendAction, metavar="FILE",
+        help="filename(s) with workspace segments. Also "
+        "accepts a glob in parentheses [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "-i", "--isochore-bed-file", "--isochores", "--isochore-file",
-        dest="isochore_files", type="string", action="append",
-        help="filename with isochore segments. Also "
-        "accepts a glob in parentheses [default=%default].")
+        dest="isochore_files", nargs="+", action=E.ExtendAction, metavar="FILE",
+        help="filename(s) with isochore segments. Also "
+        "accepts a glob in parentheses [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "-l", "--sample-file", dest="sample_files",
-        type="string", action="append",
-        help="filename with sample files. Start processing "
-        "from samples [default=%default].")
+        nargs="+", action=E.ExtendAction, metavar="FILE",
+        help="filename(s) with sample files. Start processing "
+        "from samples [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--input-counts-file", dest="input_filename_counts",
-        type="string",
         help="start processing from counts - no segments "
-        "required [default=%default].")
+        "required [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--input-results-file", dest="input_filename_results",
-        type="string",
         help="start processing from results - no segments "
-        "required [default=%default].")
+        "required [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--ignore-segment-tracks", dest="ignore_segment_tracks",
         action="store_true",
         help="ignore segment tracks - all segments belong "
-        "to one track and called 'merged' [default=%default]")
+        "to one track and called 'merged' [default=%(default)s]")
 
-    group.add_option(
+    group.add_argument(
         "--with-segment-tracks", dest="ignore_segment_tracks",
         action="store_false",
         help="the segments data file is arranged in tracks. "
-        "[default=%default]")
+        "[default=%(default)s]")
 
-    group.add_option(
+    group.add_argument(
         "--enable-split-tracks", dest="enable_split_tracks",
         action="store_true",
         help="permit the same track to be in multiple "
-        "files [default=%default]")
+        "files [default=%(default)s]")
 
-    group.add_option(
+    group.add_argument(
         "--overlapping-annotations", dest="overlapping_annotations",
         action="store_true",
         help="the annotations within a track are overlapping and should not "
         "be merged. This is useful for working with short-read data. "
         "[default=default]")
 
-    group.add_option(
+    group.add_argument(
         "--annotations-label", dest="annotations_label",
-        type="string",
         help="ignore tracks in annotations and instead set them "
         "to label "
         "[default=default]")
 
-    group.add_option(
+    group.add_argument(
         "--annotations-to-points", dest="annotations_to_points",
-        type="choice",
         choices=("midpoint", "start", "end"),
         help="convert annotations from segments to positions. Available "
         "methods are 'midpoint', 'start' or 'end'. "
         "[default=default]")
 
-    parser.add_option_group(group)
+    group = parser.add_argument_group("Output options")
 
-    group = OptionGroup(parser, "Output options")
-
-    group.add_option(
-        "-o", "--order", dest="output_order", type="choice",
-        choices=(
-            "track", "annotation", "fold", "pvalue", "qvalue"),
+    group.add_argument(
+        "-o", "--order", dest="output_order",
+        choices=("track", "annotation", "fold", "pvalue", "qvalue"),
         help="order results in output by fold, track, etc. "
-        "[default=%default].")
+        "[default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--output-tables-pattern", dest="output_tables_pattern",
-        type="string",
         help="output pattern for result tables. Used if there "
-        "are multiple counters used [default=%default].")
+        "are multiple counters used [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--output-counts-pattern", dest="output_counts_pattern",
-        type="string",
-        help="output pattern for counts [default=%default].")
+        help="output pattern for counts [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--output-plots-pattern", dest="output_plots_pattern",
-        type="string",
-        help="output pattern for plots [default=%default]")
+        help="output pattern for plots [default=%(default)s]")
 
-    group.add_option(
+    group.add_argument(
         "--output-samples-pattern",
-        dest="output_samples_pattern", type="string",
+        dest="output_samples_pattern",
         help="output pattern for samples. Samples are "
         "stored in bed format, one for "
-        " each segment [default=%default]")
+        " each segment [default=%(default)s]")
 
-    group.add_option(
-        "--output-stats", dest="output_stats", type="choice",
-        action="append",
+    group.add_argument(
+        "--output-stats", dest="output_stats", action="append",
         choices=("all",
                  "annotations", "segments",
                  "workspaces", "isochores",
@@ -186,33 +174,28 @@ def buildParser(usage=None):
                  "sample",
                  "segment_metrics",
                  "sample_metrics"),
-        help="output overlap summary stats [default=%default].")
+        help="output overlap summary stats [default=%(default)s].")
 
-    group.add_option(
-        "--output-bed", dest="output_bed", type="choice",
-        action="append",
+    group.add_argument(
+        "--output-bed", dest="output_bed", action="append",
         choices=("all",
                  "annotations", "segments",
                  "workspaces", "isochores",
                  "overlap"),
-        help="output bed files [default=%default].")
+        help="output bed files [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--descriptions", dest="input_filename_descriptions",
-        type="string",
         help="filename mapping annotation terms to "
         "descriptions. "
         "if given, the output table will contain additional "
         "columns "
-        "[default=%default]")
-
-    parser.add_option_group(group)
+        "[default=%(default)s]")
 
-    group = OptionGroup(parser, "Sampling algorithm options")
+    group = parser.add_argument_group("Sampling algorithm options")
 
-    group.add_option(
-        "-c", "--counter", dest="counters", type="choice",
-        action="append",
+    group.add_argument(
+        "-c", "--counter", dest="counters", action="append",
         choices=("nucleotide-overlap",
                  "nucleotide-density",
                  "segment-overlap",
@@ -220,10 +203,10 @@ def buildParser(usage=None):
                  "annotation-overlap",
                  "annotation-midoverlap"),
         help="quantity to use for estimating enrichment "
-        "[default=%default].")
+        "[default=%(default)s].")
 
-    group.add_option(
-        "-m", "--sampler", dest="sampler", type="choice",
+    group.add_argument(
+        "-m", "--sampler", dest="sampler",
         choices=("annotator",
                  "segments",
                  "shift",
@@ -231,113 +214,110 @@ def buildParser(usage=None):
                  "global-permutation",
                  "uniform",
                  "brute-force"),
-        help="quantity to test [default=%default].")
+        help="quantity to test [default=%(default)s].")
 
-    group.add_option(
-        "-n", "--num-samples", dest="num_samples", type="int",
-        help="number of samples to compute [default=%default].")
+    group.add_argument(
+        "-n", "--num-samples", dest="num_samples", type=int,
+        help="number of samples to compute [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--shift-extension", dest="shift_extension",
-        type="float",
+        type=float,
         help="if the sampling method is 'shift', create a "
         "segment of size # anound the segment "
         "to determine the size of the region for "
-        "shifthing [default=%default].")
+        "shifthing [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--shift-expansion", dest="shift_expansion",
-        type="float",
+        type=float,
         help="if the sampling method is 'shift', multiply each "
         "segment by # "
         "to determine the size of the region for "
-        "shifthing [default=%default].")
+        "shifthing [default=%(default)s].")
 
-    group.add_option(
-        "--bucket-size", dest="bucket_size", type="int",
+    group.add_argument(
+        "--bucket-size", dest="bucket_size", type=int,
         help="size of a bin for histogram of segment lengths. "
         "If 0, it will be automatically "
-        "scaled to fit nbuckets [default=%default]")
+        "scaled to fit nbuckets [default=%(default)s]")
 
-    group.add_option(
-        "--nbuckets", dest="nbuckets", type="int",
+    group.add_argument(
+        "--nbuckets", dest="nbuckets", type=int,
         help="number of bins for histogram of segment "
-        "lengths [default=%default]")
+        "lengths [default=%(default)s]")
 
-    parser.add_option_group(group)
+    group = parser.add_argument_group("Statistics options")
 
-    group = OptionGroup(parser, "Statistics options")
-
-    group.add_option(
+    group.add_argument(
         "-p", "--pvalue-method", dest="pvalue_method",
-        type="choice",
         choices=("empirical", "norm", ),
-        help="type of pvalue reported [default=%default].")
+        help="type of pvalue reported [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "-q", "--qvalue-method", dest="qvalue_method",
-        type="choice",
         choices=(
             "storey", "BH", "bonferroni", "holm", "hommel",
             "hochberg", "BY", "none"),
         help="method to perform multiple testing correction "
-        "by controlling the fdr [default=%default].")
+        "by controlling the fdr [default=%(default)s].")
 
-    group.add_option(
-        "--qvalue-lambda", dest="qvalue_lambda", type="float",
-        help="fdr computation: lambda [default=%default].")
+    group.add_argument(
+        "--qvalue-lambda", dest="qvalue_lambda", type=float,
+        help="fdr computation: lambda [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--qvalue-pi0-method", dest="qvalue_pi0_method",
-        type="choice",
         choices=("smoother", "bootstrap"),
         help="fdr computation: method for estimating pi0 "
-        "[default=%default].")
+        "[default=%(default)s].")
 
-    group.add_option(
-        "--pseudo-count", dest="pseudo_count", type="float",
+    group.add_argument(
+        "--pseudo-count", dest="pseudo_count", type=float,
         help="pseudo count. The pseudo count is added to both "
         "the observed and expected overlap. "
         "Using a pseudo-count avoids gat reporting fold changes "
-        "of 0 [default=%default].")
+        "of 0 [default=%(default)s].")
 
-    group.add_option(
-        "--null", dest="null", type="string",
+    group.add_argument(
+        "--null", dest="null",
         help="null hypothesis. The default is to test "
         "categories "
         "for enrichment/depletion. "
         "If a filename with gat output is given, gat will test "
         "for the difference "
         "in fold change between the segments supplied and in "
-        "the other file [default=%default].")
-
-    parser.add_option_group(group)
+        "the other file [default=%(default)s].")
 
-    group = OptionGroup(parser, "Processing options")
+    group = parser.add_argument_group("Processing options")
 
-    group.add_option(
-        "-e", "--cache", dest="cache", type="string",
-        help="filename for caching samples [default=%default].")
+    group.add_argument(
+        "-e", "--cache", dest="cache",
+        help="filename for caching samples [default=%(default)s].")
 
-    group.add_option(
-        "-t", "--num-threads", dest="num_threads", type="int",
+    group.add_argument(
+        "-t", "--num-threads", dest="num_threads", type=int,
         help="number of threads to use for sampling "
-        "[default=%default]")
+        "[default=%(default)s]")
 
-    group.add_option(
-        "--random-seed", dest='random_seed', type="int",
-        help="random seed to initialize number generator "
-        "with [%default].")
+    group.add_argument(
+        "--interval-cache-dir", dest="interval_cache_dir",
+        help="directory for caching parsed segment, annotation and "
+        "workspace files. Files are re-parsed if they have been "
+        "modified [default=%(default)s].")
 
-    parser.add_option_group(group)
+    group.add_argument(
+        "--random-seed", dest='random_seed', type=int,
+        help="random seed to initialize number generator "
+        "with [%(default)s].")
 
-    group = OptionGroup(parser, "Workspace manipulation (experimental)")
+    group = parser.add_argument_group("Workspace manipulation (experimental)")
 
-    group.add_option(
-        "--conditional", dest="conditional", type="choice",
+    group.add_argument(
+        "--conditional", dest="conditional",
         choices=("unconditional", "annotation-centered",
                  "segment-centered", "cooccurance"),
-        help="conditional workspace creation [default=%default]"
+        help="conditional workspace creation [default=%(default)s]"
         "*cooccurance* - compute enrichment only within "
         "workspace "
         "segments that contain both segments "
@@ -347,40 +327,38 @@ def buildParser(usage=None):
         "segment-centered - workspace centered around "
         "segments. See --conditional-extension")
 
-    group.add_option(
+    group.add_argument(
         "--conditional-extension", dest="conditional_extension",
-        type="int",
+        type=int,
         help="if workspace is created conditional, extend by "
-        "this amount (in bp) [default=%default].")
+        "this amount (in bp) [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--conditional-expansion", dest="conditional_expansion",
-        type="float",
+        type=float,
         help="if workspace is created conditional, expand by "
-        "this amount (ratio) [default=%default].")
+        "this amount (ratio) [default=%(default)s].")
 
-    group.add_option(
+    group.add_argument(
         "--restrict-workspace", dest="restrict_workspace",
         action="store_true",
         help="restrict workspace to those segments that "
         "contain both track "
-        "and annotations [default=%default]")
+        "and annotations [default=%(default)s]")
 
-    group.add_option(
+    group.add_argument(
         "--truncate-workspace-to-annotations",
         dest="truncate_workspace_to_annotations",
         action="store_true",
         help="truncate workspace with annotations "
-        "[default=%default]")
+        "[default=%(default)s]")
 
-    group.add_option(
+    group.add_argument(
         "--truncate-segments-to-workspace",
         dest="truncate_segments_to_workspace",
         action="store_true",
         help="truncate segments to workspace before "
-        "sampling [default=%default]")
-
-    parser.add_option_group(group)
+        "sampling [default=%(default)s]")
 
     parser.set_defaults(
         annotation_files=[],
@@ -397,6 +375,7 @@ def buildParser(usage=None):
         input_filename_counts=None,
         input_filename_descriptions=None,
         input_filename_results=None,
+        interval_cache_dir=None,
         nbuckets=100000,
         null="default",
         num_samples=1000,
@@ -438,50 +417,48 @@ def iterator_results(annotator_results):
 
 class DummyAnnotatorResult:
 
-    format_observed = "%i"
+    __slots__ = ("track", "annotation", "counter",
+                 "observed", "expected", "lower95", "upper95",
+                 "stddev", "fold", "l2fold", "pvalue", "qvalue",
+                 "format_observed")
+
     format_expected = "%6.4f"
     format_fold = "%6.4f"
     format_pvalue = "%6.4e"
 
+    format_row = "\t".join(("%s", "%s", "%s") +
+                           (format_expected,) * 4 +
+                           (format_fold, format_pvalue, format_pvalue))
+
     def __init__(self):
-        pass
+        self.format_observed = "%i"
 
     @classmethod
     def _fromLine(cls, line):
-        x = cls()
         data = line[:-1].split("\t")
-        x.track, x.annotation = data[:2]
+        return cls._fromValues(data[0], data[1],
+                               list(map(float, data[2:11])))
+
+    @classmethod
+    def _fromValues(cls, track, annotation, values):
+        x = cls()
+        x.track, x.annotation = track, annotation
         x.counter = "na"
         x.observed, x.expected, x.lower95, x.upper95, x.stddev, x.fold, x.l2fold, x.pvalue, x.qvalue = \
-            list(map(float, data[2:11]))
-        if len(data) > 11:
-            (track_nsegments,
-             track_size,
-             track_density,
-             annotation_nsegments,
-             annotation_size,
-             annotation_density,
-             overlap_nsegments,
-             overlap_size,
-             overlap_density,
-             percent_overlap_nsegments_track,
-             percent_overlap_size_track,
-             percent_overlap_nsegments_annotation,
-             percent_overlap_size_annotation) = list(map(float, data[11:24]))
-
+            values
         return x
 
     def __str__(self):
-        return "\t".join((self.track,
-                          self.annotation,
-                          self.format_observed % self.observed,
-                          self.format_expected % self.expected,
-                          self.format_expected % self.lower95,
-                          self.format_expected % self.upper95,
-                          self.format_expected % self.stddev,
-                          self.format_fold % self.fold,
-                          self.format_pvalue % self.pvalue,
-                          self.format_pvalue % self.qvalue))
+        return self.format_row % (self.track,
+                                  self.annotation,
+                                  self.format_observed % self.observed,
+                                  self.expected,
+                                  self.lower95,
+                                  self.upper95,
+                                  self.stddev,
+                                  self.fold,
+                                  self.pvalue,
+                                  self.qvalue)
 
 
 WorkData = collections.namedtuple("WorkData",
@@ -691,7 +668,12 @@ class UnconditionalSampler:
 
             ww = [(w, samples_outfile, metrics_outfile, lock) for w in work]
 
-            for i, r in enumerate(pool.imap_unordered(computeSample, ww)):
+            # send samples to workers in batches to reduce
+            # communication overhead
+            chunksize = max(1, n // (4 * self.num_threads))
+
+            for i, r in enumerate(pool.imap_unordered(computeSample, ww,
+                                                      chunksize=chunksize)):
                 if i % report_interval == 0:
                     E.info("%i/%i done (%5.2f)" % (i, n, 100.0 * i / n))
                 results.append(r)
@@ -1090,7 +1072,12 @@ def run(segments,
 
 def fromCounts(filename):
     '''build annotator results from a tab-separated table
-    with counts.'''
+    with counts.
+
+    Counts are converted directly into a numpy array. The array
+    is only needed while the result is built, as the result
+    keeps its own copy of the samples.
+    '''
 
     annotator_results = []
 
@@ -1104,14 +1091,14 @@ def fromCounts(filename):
 
         for line in infile:
             track, annotation, observed, counts = line[:-1].split("\t")
-            samples = numpy.array(
-                list(map(float, counts.split(","))), dtype=numpy.float)
-            observed = float(observed)
             annotator_results.append(Engine.AnnotatorResult(
                 track=track,
                 annotation=annotation,
                 counter="na",
-                observed=observed,
-                samples=samples))
+                observed=float(observed),
+                samples=numpy.array(counts.split(","),
+                                    dtype=numpy.float64)))
+
+    E.info("loaded counts for %i results" % len(annotator_results))
 
     return annotator_results
@@ -227,7 +227,9 @@ def main(argv):
         shift_extension=0,
         overlap_mode="midpoint",
         truncate_workspace_to_annotations=False,
-        truncate_segments_to_workspace=False
+        truncate_segments_to_workspace=False,
+        interval_cache_dir=None,
+        num_threads=0
     )
 
     # add common options (-h/--help, ...) and parse command line
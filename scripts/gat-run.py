@@ -61,7 +61,6 @@ Code
 
 import os
 import sys
-import re
 import time
 import numpy
 import random
@@ -95,9 +94,7 @@ def _fromSegments(options, args):
                     "sample_metrics",
                     ):
         if section in options.output_stats or \
-            "all" in options.output_stats or \
-                len([x for x in options.output_stats
-                     if re.search(x, "section")]) > 0:
+                "all" in options.output_stats:
             outfiles[section] = E.openOutputFile(section)
 
     if 'sample_metrics' in outfiles:
@@ -290,7 +287,18 @@ def main(argv=None):
 
     if options.input_filename_counts:
         # use pre-computed counts
-        annotator_results = Engine.fromCounts(options.input_filename_counts)
+        annotator_results = gat.fromCounts(options.input_filename_counts)
+
+    elif options.input_filename_results and \
+            IO.isResultsTableCurrent(options.input_filename_results,
+                                     options):
+        # nothing to re-compute, output results as they are
+        E.info("results in %s are current - copying" %
+               options.input_filename_results)
+        IO.copyAnnotatorResults(options.input_filename_results,
+                                options.stdout)
+        E.Stop()
+        return
 
     elif options.input_filename_results:
         # use previous results (re-computes fdr)
@@ -37,7 +37,7 @@ class TestRunning(unittest.TestCase):
 
         parser = gat.buildParser()
 
-        options, args = parser.parse_args([])
+        options = parser.parse_args([])
 
         options.segment_files = self.filename_segments
         options.annotation_files = self.filename_annotations
@@ -0,0 +1,404 @@
+"""test gat input/output functions."""
+
+import unittest
+import argparse
+import unittest.mock
+import io
+import os
+import shutil
+import tempfile
+import glob
+import pickle
+import numpy
+
+import gat
+import gat.IO as IO
+
+
+class TestIsSectionSelected(unittest.TestCase):
+
+    def testSelected(self):
+        self.assertTrue(IO.isSectionSelected("overlap", ["overlap"]))
+        self.assertTrue(IO.isSectionSelected("overlap", ["all"]))
+        self.assertTrue(IO.isSectionSelected("stats_workspaces_input",
+                                             ["workspaces"]))
+        self.assertTrue(IO.isSectionSelected("stats_segments_truncated",
+                                             ["annotations", "segments"]))
+
+    def testNotSelected(self):
+        self.assertFalse(IO.isSectionSelected("overlap", []))
+        self.assertFalse(IO.isSectionSelected("stats_isochores_raw",
+                                              ["workspaces", "segments"]))
+
+
+class TestExpandGlobs(unittest.TestCase):
+
+    filenames = ("a.bed.gz", "b.bed.gz", "c.bed", ".hidden.bed.gz")
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for fn in self.filenames:
+            open(os.path.join(self.tmpdir, fn), "w").close()
+        os.mkdir(os.path.join(self.tmpdir, "sub"))
+        open(os.path.join(self.tmpdir, "sub", "d.bed.gz"), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check(self, patterns):
+        patterns = [os.path.join(self.tmpdir, x) for x in patterns]
+        self.assertEqual(
+            sorted(IO.expandGlobs(patterns)),
+            sorted(sum([glob.glob(x) for x in patterns], [])))
+
+    def testWildcard(self):
+        self.check(["*.bed.gz"])
+
+    def testLiteral(self):
+        self.check(["a.bed.gz", "c.bed", "missing.bed"])
+
+    def testHidden(self):
+        self.check([".*.gz"])
+
+    def testMultipleDirectories(self):
+        self.check(["*.bed", "sub/*.gz", "*/d.bed.gz"])
+
+    def testOrder(self):
+        patterns = [os.path.join(self.tmpdir, x)
+                    for x in ("c.bed", "a.bed.gz")]
+        self.assertEqual(IO.expandGlobs(patterns), patterns)
+
+    def testLiteralWithoutScan(self):
+        patterns = [os.path.join(self.tmpdir, x)
+                    for x in ("c.bed", "missing.bed")]
+        with unittest.mock.patch("os.scandir") as scandir:
+            self.assertEqual(IO.expandGlobs(patterns), patterns[:1])
+        self.assertFalse(scandir.called)
+
+
+class TestReadAnnotatorResults(unittest.TestCase):
+
+    filename = os.path.join(os.path.dirname(__file__),
+                            "data", "output_single.tsv")
+
+    def testRead(self):
+        results = IO.readAnnotatorResults(self.filename)
+        self.assertEqual(len(results), 28)
+
+        with open(self.filename) as inf:
+            lines = [x for x in inf
+                     if not x.startswith("#") and
+                     not x.startswith("track")]
+
+        for r, line in zip(results, lines):
+            data = line[:-1].split("\t")
+            self.assertEqual(r.track, data[0])
+            self.assertEqual(r.annotation, data[1])
+            self.assertEqual(r.observed, float(data[2]))
+            self.assertEqual(r.fold, float(data[7]))
+            self.assertEqual(r.pvalue, float(data[9]))
+            self.assertEqual(r.qvalue, float(data[10]))
+
+    def testDescriptions(self):
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, "results.tsv")
+        with open(filename, "w") as outf:
+            outf.write("track\tannotation\tobserved\texpected\tCI95low\t"
+                       "CI95high\tstddev\tfold\tl2fold\tpvalue\tqvalue\t"
+                       "description\n")
+            outf.write("t1\ta1\t0\t3.5\t1.0\t6.0\t1.5\t0.2\t-inf\t"
+                       "1.0e-02\t2.0e-02\tgene #1\n")
+        try:
+            results = IO.readAnnotatorResults(filename)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(len(results), 1)
+        r = results[0]
+        self.assertEqual((r.track, r.annotation), ("t1", "a1"))
+        self.assertEqual(r.expected, 3.5)
+        self.assertEqual(r.l2fold, float("-inf"))
+        self.assertEqual(r.qvalue, 0.02)
+
+
+class TestSortResults(unittest.TestCase):
+
+    filename = os.path.join(os.path.dirname(__file__),
+                            "data", "output_single.tsv")
+
+    def setUp(self):
+        self.results = IO.readAnnotatorResults(self.filename)
+
+    def check(self, order, key):
+        self.assertEqual(IO.sortResults(self.results, order),
+                         sorted(self.results, key=key))
+
+    def testTrack(self):
+        self.check("track", lambda x: (x.track, x.annotation))
+
+    def testAnnotation(self):
+        self.check("annotation", lambda x: (x.annotation, x.track))
+
+    def testFold(self):
+        self.check("fold", lambda x: x.fold)
+
+    def testPValue(self):
+        self.check("pvalue", lambda x: x.pvalue)
+
+    def testEmpty(self):
+        self.assertEqual(IO.sortResults([], "track"), [])
+        self.assertEqual(IO.sortResults([], "fold"), [])
+
+    def testUnknownOrder(self):
+        self.assertRaises(ValueError, IO.sortResults, self.results, "size")
+
+
+class TestOutputResults(unittest.TestCase):
+
+    filename = os.path.join(os.path.dirname(__file__),
+                            "data", "output_single.tsv")
+
+    def setUp(self):
+        self.results = IO.readAnnotatorResults(self.filename)
+        self.options = gat.buildParser().parse_args([])
+        self.options.stdout = io.StringIO()
+
+    def getObserved(self, **kwargs):
+        IO.outputResults(self.results, self.options,
+                         IO.Engine.AnnotatorResult.headers,
+                         [], 0, {}, **kwargs)
+        lines = self.options.stdout.getvalue().splitlines()
+        return [x.split("\t")[2] for x in lines[1:]]
+
+    def testFormatObserved(self):
+        observed = self.getObserved()
+        self.assertEqual(len(observed), len(self.results))
+        self.assertTrue(all("." not in x for x in observed))
+
+    def testCustomFormatObserved(self):
+        observed = self.getObserved(format_observed="%6.4f")
+        self.assertEqual(sorted(observed),
+                         sorted("%6.4f" % x.observed for x in self.results))
+
+
+class TestResultsTableCurrent(unittest.TestCase):
+
+    filename = os.path.join(os.path.dirname(__file__),
+                            "data", "output_single.tsv")
+
+    def setUp(self):
+        self.options = gat.buildParser().parse_args([])
+
+    def testCurrent(self):
+        self.assertTrue(IO.isResultsTableCurrent(self.filename,
+                                                 self.options))
+
+    def testChangedOptions(self):
+        for key, value in (("output_order", "track"),
+                           ("qvalue_method", "storey"),
+                           ("pvalue_method", "norm"),
+                           ("output_plots_pattern", "%s.png")):
+            options = gat.buildParser().parse_args([])
+            setattr(options, key, value)
+            self.assertFalse(IO.isResultsTableCurrent(self.filename,
+                                                      options), key)
+
+    def testCopy(self):
+        outfile = io.StringIO()
+        IO.copyAnnotatorResults(self.filename, outfile)
+        with open(self.filename) as inf:
+            expected = "".join(x for x in inf if not x.startswith("#"))
+        self.assertEqual(outfile.getvalue(), expected)
+
+
+class TestReadSegmentListCache(unittest.TestCase):
+
+    filename = os.path.join(os.path.dirname(__file__),
+                            "data", "segments_multiple.bed.gz")
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testCache(self):
+        expected = IO.readSegmentList("segments", [self.filename],
+                                      ignore_tracks=False)
+        for x in range(2):
+            cached = IO.readSegmentList("cached", [self.filename],
+                                        ignore_tracks=False,
+                                        cache_dir=self.tmpdir)
+            self.assertEqual(len(os.listdir(self.tmpdir)), 1)
+            self.assertEqual(cached.getName(), "cached")
+            self.assertEqual(cached.tracks, expected.tracks)
+            self.assertEqual(cached.sum(), expected.sum())
+            for track in expected.tracks:
+                self.assertEqual(cached[track].counts(),
+                                 expected[track].counts())
+
+    def testKeyDependsOnOptions(self):
+        IO.readSegmentList("segments", [self.filename],
+                           ignore_tracks=False,
+                           cache_dir=self.tmpdir)
+        merged = IO.readSegmentList("segments", [self.filename],
+                                    ignore_tracks=True,
+                                    cache_dir=self.tmpdir)
+        self.assertEqual(len(os.listdir(self.tmpdir)), 2)
+        self.assertEqual(list(merged.tracks), ["merged"])
+
+    def testKeyDependsOnEngine(self):
+        key = IO.getIntervalCacheFilename(self.tmpdir, [self.filename])
+        with unittest.mock.patch.object(IO.Engine, "__file__",
+                                        self.filename):
+            self.assertNotEqual(
+                IO.getIntervalCacheFilename(self.tmpdir, [self.filename]),
+                key)
+
+    def testCorruptCache(self):
+        cache_filename = IO.getIntervalCacheFilename(
+            self.tmpdir, [self.filename])
+        with open(cache_filename, "wb") as outf:
+            outf.write(b"corrupt")
+        segments = IO.readSegmentList("segments", [self.filename],
+                                      cache_dir=self.tmpdir)
+        expected = IO.readSegmentList("segments", [self.filename])
+        self.assertEqual(segments.getName(), "segments")
+        self.assertEqual(segments.tracks, expected.tracks)
+        # the cache has been replaced
+        with open(cache_filename, "rb") as inf:
+            self.assertEqual(pickle.load(inf).tracks, expected.tracks)
+
+    def testFailedSave(self):
+        cache_dir = os.path.join(self.tmpdir, "cache")
+        with unittest.mock.patch("pickle.dump", side_effect=IOError):
+            self.assertRaises(IOError, IO.readSegmentList,
+                              "segments", [self.filename],
+                              cache_dir=cache_dir)
+        self.assertEqual(os.listdir(cache_dir), [])
+
+
+class TestOutputOverlapStats(unittest.TestCase):
+
+    datadir = os.path.join(os.path.dirname(__file__), "data")
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.segments = IO.readSegmentList(
+            "segments",
+            [os.path.join(self.datadir, "segments_multiple.bed.gz")],
+            ignore_tracks=False)
+        self.workspaces = IO.readSegmentList(
+            "workspaces",
+            [os.path.join(self.datadir, "workspace.bed.gz")])
+        self.segments.normalize()
+        self.workspaces.normalize()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def compute(self, num_threads):
+        outdir = os.path.join(self.tmpdir, str(num_threads))
+        os.mkdir(outdir)
+        options = unittest.mock.Mock(
+            output_filename_pattern=os.path.join(outdir, "%s.tsv"),
+            output_force=False)
+        with unittest.mock.patch.object(IO.E, "global_options", options):
+            IO.outputOverlapStats(self.workspaces, self.segments,
+                                  num_threads=num_threads)
+        result = {}
+        for fn in os.listdir(outdir):
+            with open(os.path.join(outdir, fn)) as inf:
+                result[fn] = inf.read()
+        return result
+
+    def testParallel(self):
+        serial = self.compute(0)
+        self.assertEqual(len(serial), len(list(self.segments.tracks)))
+        self.assertTrue(all(serial.values()))
+        self.assertEqual(self.compute(2), serial)
+
+
+class TestBuildPlotFilename(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.options = gat.buildParser().parse_args([])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testSanitize(self):
+        self.options.output_plots_pattern = os.path.join(
+            self.tmpdir, "%s.png")
+        for key, expected in (("a b:c(d)", "a_b_c_d_.png"),
+                              ("x-y_z.1", "x-y_z.1.png")):
+            self.assertEqual(
+                os.path.basename(IO.buildPlotFilename(self.options, key)),
+                expected)
+
+    def testCreateDirectory(self):
+        self.options.output_plots_pattern = os.path.join(
+            self.tmpdir, "%s", "plot.png")
+        filename = IO.buildPlotFilename(self.options, "track")
+        self.assertEqual(filename,
+                         os.path.join(self.tmpdir, "track", "plot.png"))
+        self.assertTrue(os.path.isdir(os.path.dirname(filename)))
+
+    def testRecreateDirectory(self):
+        self.options.output_plots_pattern = os.path.join(
+            self.tmpdir, "plots", "%s.png")
+        filename = IO.buildPlotFilename(self.options, "track")
+        shutil.rmtree(os.path.dirname(filename))
+        IO.buildPlotFilename(self.options, "track")
+        self.assertTrue(os.path.isdir(os.path.dirname(filename)))
+
+
+@unittest.skipUnless(IO.HASPLOT, "matplotlib not available")
+class TestPlotResults(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.options = gat.buildParser().parse_args([])
+        self.options.output_plots_pattern = os.path.join(self.tmpdir,
+                                                         "%s.png")
+        samples = numpy.arange(100, dtype=numpy.float64)
+        self.results = [
+            IO.Engine.AnnotatorResult("track", annotation, "na",
+                                      observed, samples)
+            for annotation, observed in (("a1", 40.0), ("a2", 70.0))]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testParallel(self):
+        self.options.num_threads = 2
+        IO.plotResults(self.results, self.options)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ["pvalue.png", "track-a1.png", "track-a2.png"])
+
+    def testWithoutNumThreads(self):
+        # gat-compare passes options without num_threads
+        options = argparse.Namespace(
+            output_plots_pattern=self.options.output_plots_pattern)
+        IO.plotResults(self.results, options)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ["pvalue.png", "track-a1.png", "track-a2.png"])
+
+
+class TestNormalDensity(unittest.TestCase):
+
+    def testDensity(self):
+        x = numpy.linspace(-10, 30, 101)
+        mu, sigma = 5.0, 3.5
+        expected = 1.0 / (sigma * numpy.sqrt(2 * numpy.pi)) * \
+            numpy.exp(- (x - mu) ** 2 / (2 * sigma ** 2))
+        self.assertTrue(numpy.allclose(IO.normalDensity(x, mu, sigma),
+                                       expected))
+
+    def testInputUnchanged(self):
+        x = numpy.arange(10, dtype=numpy.float64)
+        IO.normalDensity(x, 5.0, 1.0)
+        self.assertTrue(numpy.all(x == numpy.arange(10)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,14 @@
 
 import unittest
 import os
+import sys
+import shutil
+import tempfile
 import numpy
 
+import gat
+import gat.Experiment as E
+
 from gat.Engine import AnnotatorResult, IntervalCollection, \
     Samples, SamplesCached, computeFDR, \
     SamplerAnnotator
@@ -129,6 +135,99 @@ class TestPValue(GatTest):
         self.assertEqual(result.pvalue, 0.57)
 
 
+class TestBuildParser(GatTest):
+    '''test command line parsing.'''
+
+    def setUp(self):
+        self.global_options = E.global_options
+        self.global_args = E.global_args
+
+    def tearDown(self):
+        E.global_options = self.global_options
+        E.global_args = self.global_args
+
+    def testDefaults(self):
+        options = gat.buildParser().parse_args([])
+        self.assertEqual(options.segment_files, [])
+        self.assertEqual(options.counters, [])
+        self.assertEqual(options.num_samples, 1000)
+        self.assertEqual(options.output_order, "fold")
+        self.assertEqual(options.num_threads, 0)
+
+    def testDefaultsNotShared(self):
+        parser = gat.buildParser()
+        options = parser.parse_args(["-s", "a"])
+        self.assertEqual(options.segment_files, ["a"])
+        self.assertEqual(parser.parse_args([]).segment_files, [])
+
+    def testMultipleFiles(self):
+        options = gat.buildParser().parse_args(
+            ["-s", "a", "b", "-s", "c", "--annotations=d", "-w", "e"])
+        self.assertEqual(options.segment_files, ["a", "b", "c"])
+        self.assertEqual(options.annotation_files, ["d"])
+        self.assertEqual(options.workspace_files, ["e"])
+
+    def testTypes(self):
+        options = gat.buildParser().parse_args(
+            ["-n", "10", "--pseudo-count", "0.5", "-c", "segment-overlap"])
+        self.assertEqual(options.num_samples, 10)
+        self.assertEqual(options.pseudo_count, 0.5)
+        self.assertEqual(options.counters, ["segment-overlap"])
+
+    def testStart(self):
+        parser = gat.buildParser()
+        parser.set_defaults(output_filename_pattern="out/%s")
+        options, args = E.Start(
+            parser,
+            argv=["gat-run.py", "-s", "a", "b", "-v", "0"],
+            add_output_options=True)
+        self.assertEqual(args, [])
+        self.assertEqual(options.segment_files, ["a", "b"])
+        self.assertEqual(options.loglevel, 0)
+        # user defaults take precedence
+        self.assertEqual(options.output_filename_pattern, "out/%s")
+        self.assertEqual(options.output_force, False)
+        self.assertEqual(options.timeit_header, None)
+        self.assertEqual(options.short_help, None)
+        self.assertTrue(options.stdout is sys.stdout)
+
+
+class TestFromCounts(GatTest):
+    '''test reading results from a counts file.'''
+
+    counts = (("track1", "annotation1", 12, (3, 10, 5, 8, 14)),
+              ("track1", "annotation2", 0, (1, 0, 2, 0, 0)),
+              ("track2", "annotation1", 7, (7, 7, 6, 9, 4)))
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "counts.tsv")
+        with open(self.filename, "w") as outf:
+            outf.write("track\tannotation\tobserved\tcounts\n")
+            for track, annotation, observed, samples in self.counts:
+                outf.write("%s\t%s\t%i\t%s\n" %
+                           (track, annotation, observed,
+                            ",".join(map(str, samples))))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testFromCounts(self):
+        results = gat.fromCounts(self.filename)
+        self.assertEqual(len(results), len(self.counts))
+        for r, (track, annotation, observed, samples) in zip(
+                results, self.counts):
+            expected = AnnotatorResult(track, annotation, "na",
+                                       float(observed),
+                                       numpy.array(samples, dtype=float))
+            self.assertEqual(str(r), str(expected))
+
+    def testWrongHeader(self):
+        with open(self.filename, "w") as outf:
+            outf.write("track\tannotation\tobserved\n")
+        self.assertRaises(ValueError, gat.fromCounts, self.filename)
+
+
 class TestSamples(GatTest):
 
     nsamples = 1000
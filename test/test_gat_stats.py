@@ -2,7 +2,9 @@
 '''
 
 import unittest
+import numpy
 import gat
+import gat.Stats as Stats
 
 
 class TestSNPs(unittest.TestCase):
@@ -45,5 +47,30 @@ class TestSNPs(unittest.TestCase):
         self.check(workspace, annotations, segments)
 
 
+class TestQValues(unittest.TestCase):
+
+    def testFixedPi0(self):
+        pvalues = [0.01, 0.02, 0.03, 0.04, 0.05]
+        fdr = Stats.computeQValues(pvalues, pi0=1.0)
+        self.assertTrue(numpy.allclose(fdr.qvalues, [0.05] * 5))
+
+    def testTies(self):
+        pvalues = [0.04, 0.01, 0.04, 0.5, 1.0]
+        fdr = Stats.computeQValues(pvalues, pi0=1.0)
+        self.assertTrue(numpy.allclose(fdr.qvalues,
+                                       [0.0667, 0.05, 0.0667, 0.625, 1.0],
+                                       atol=1e-4))
+
+    def testMonotonic(self):
+        pvalues = numpy.random.RandomState(1).uniform(0, 1, 1000) ** 3
+        fdr = Stats.computeQValues(pvalues)
+        idx = numpy.argsort(pvalues)
+        self.assertTrue(numpy.all(numpy.diff(fdr.qvalues[idx]) >= 0))
+        self.assertTrue(numpy.all(fdr.qvalues <= 1.0))
+
+    def testOutOfRange(self):
+        self.assertRaises(ValueError, Stats.computeQValues, [0.5, 1.5])
+
+
 if __name__ == '__main__':
     unittest.main()